@@ -5,21 +5,37 @@ Flask web application for viewing live and recorded matches.
 from __future__ import annotations
 
 from datetime import datetime
+from functools import lru_cache
 import logging
+import signal
 import sqlite3
-from typing import Any, Dict, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 import os
 import webbrowser
 import requests
 
 import click
+import numpy as np
+import orjson
+import waitress
 from flask import Flask, Response, jsonify, render_template, request
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.http import generate_etag
+from werkzeug.security import safe_join
 
 import capture
 import db
 from config import APP_SETTINGS, CAPTURE_DEFAULTS, MAP_DEFAULTS, PATHS
 from map_hashes import MapInfo, UNKNOWN_MAP_INFO, lookup_map_info
-from models import MatchDetailPayload, MatchListPayload, MatchSummaryPayload
+from models import (
+    MatchDetailPayload,
+    MatchListPayload,
+    MatchSummaryPayload,
+    PositionEntry,
+)
 from updater import check_and_update_on_start
 import tray
 
@@ -30,8 +46,47 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 MAPS_DIR = PATHS.maps_dir
+MAP_IMAGE_MAX_AGE = 31536000
+MAP_IMAGE_CACHE_SIZE = 64
+CTRL_C_POLL_SECONDS = 1.0
+TEMPLATE_NAMES = ("index.html", "match.html", "waiting.html")
+# Stored timestamps are already ISO-8601, so the default display format can be
+# produced by slicing instead of a datetime round-trip.
+_DATETIME_FAST_PATH = APP_SETTINGS.datetime_format == "%Y-%m-%d %H:%M:%S"
+# Rendered dashboard HTML keyed by the match-list fingerprint; holds one entry.
+_INDEX_CACHE: Dict[tuple, str] = {}
+INDEX_COUNT_BUCKET = 50
+# Serialized /api/matches body keyed by the exact fingerprint; holds one entry.
+_MATCHES_CACHE: Dict[tuple, bytes] = {}
+# Encoded /api/status body shared by the live view's polling burst.
+_STATUS_CACHE: Dict[str, Any] = {"expires": 0.0, "body": b"", "etag": ""}
+_STATUS_LOCK = threading.Lock()
+STATUS_CACHE_SECONDS = 0.5
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson for every jsonify call."""
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data to a JSON string."""
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        """Deserialize JSON text or UTF-8 bytes."""
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Return a JSON response, writing orjson's bytes without re-encoding."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype,
+        )
 
 
+@lru_cache(maxsize=None)
 def _resolve_map_info(map_hash: Optional[str]) -> MapInfo:
     """Return a map metadata entry, defaulting to unknown on empty hashes."""
     if not map_hash:
@@ -43,6 +98,22 @@ def _format_datetime(value: Optional[str]) -> str:
     """Format ISO timestamps for templates while tolerating invalid input."""
     if not value:
         return ""
+    if (
+        _DATETIME_FAST_PATH
+        and len(value) >= 19
+        and value[4] == "-"
+        and value[7] == "-"
+        and value[10] in "T "
+        and value[13] == ":"
+        and value[16] == ":"
+    ):
+        return f"{value[:10]} {value[11:19]}"
+    return _format_iso_timestamp(value)
+
+
+@lru_cache(maxsize=4096)
+def _format_iso_timestamp(value: str) -> str:
+    """Parse and format a non-canonical ISO timestamp, memoized per string."""
     try:
         parsed = datetime.fromisoformat(value)
     except ValueError:
@@ -50,51 +121,26 @@ def _format_datetime(value: Optional[str]) -> str:
     return parsed.strftime(APP_SETTINGS.datetime_format)
 
 
-def _calculate_duration_seconds(match: db.Match) -> Optional[int]:
-    """Return match duration in seconds, or None if timestamps are invalid."""
-    if not match.started_at:
-        return None
-    try:
-        start_dt = datetime.fromisoformat(match.started_at)
-        end_dt = (
-            datetime.fromisoformat(match.ended_at)
-            if match.ended_at
-            else datetime.now()
-        )
-    except ValueError:
-        return None
-    return max(0, int((end_dt - start_dt).total_seconds()))
-
-
-def _build_match_summary(
-    match: db.Match,
-    conn: sqlite3.Connection,
-) -> Dict[str, Any]:
+def _build_match_summary(match: db.Match) -> Dict[str, Any]:
     """Build the match summary payload used by the index view."""
     map_info = _resolve_map_info(match.map_hash)
     air_info = (
         _resolve_map_info(match.air_map_hash) if match.air_map_hash else None
     )
-    position_count = db.get_positions_count(conn, match.id)
-    duration_seconds = _calculate_duration_seconds(match)
     payload = MatchSummaryPayload.from_match(
         match,
         map_info,
         air_info,
-        position_count,
-        duration_seconds,
+        match.position_count,
+        match.duration_seconds,
     )
     return payload.to_dict()
 
 
-def _build_match_payload(
-    match: db.Match,
-    conn: sqlite3.Connection,
-) -> Dict[str, Any]:
+def _build_match_payload(match: db.Match) -> Dict[str, Any]:
     """Build the API payload for listing matches."""
     map_info = _resolve_map_info(match.map_hash)
-    position_count = db.get_positions_count(conn, match.id)
-    payload = MatchListPayload.from_match(match, map_info, position_count)
+    payload = MatchListPayload.from_match(match, map_info, match.position_count)
     return payload.to_dict()
 
 
@@ -105,21 +151,105 @@ def _build_match_detail_payload(match: db.Match) -> Dict[str, Any]:
     return payload.to_dict()
 
 
-def _parse_since_ms(raw_value: Any) -> int:
-    """Parse the since value into milliseconds, accepting floats in seconds."""
-    if isinstance(raw_value, str) and "." in raw_value:
-        return int(float(raw_value) * 1000)
-    return int(raw_value)
+def _index_strings(
+    values: List[Optional[str]],
+) -> Tuple[List[Optional[str]], np.ndarray]:
+    """Return the distinct values and a uint16 index into them per row."""
+    lookup: Dict[Optional[str], int] = {}
+    indices = [lookup.setdefault(value, len(lookup)) for value in values]
+    return list(lookup), np.array(indices, dtype="<u2")
+
+
+def _encode_positions_binary(bundle: Dict[str, Any]) -> bytes:
+    """Pack a positions bundle into the little-endian live-view layout.
+
+    Layout: uint32 header length, uint32 row count, a space-padded JSON
+    header (ticks plus color/type/icon dictionaries), then per-row columns:
+    id and tick_id as uint32; x, y, x_ground and y_ground as float32 (NaN
+    for missing ground coordinates); color, type and icon indices as
+    uint16; and is_poi as uint8.
+    """
+    columns = bundle["positions"]
+    count = len(columns["id"])
+    colors, color_idx = _index_strings(columns["color"])
+    types, type_idx = _index_strings(columns["type"])
+    icons, icon_idx = _index_strings(columns["icon"])
+    header = orjson.dumps(
+        {
+            "ticks": bundle["ticks"],
+            "colors": colors,
+            "types": types,
+            "icons": icons,
+        }
+    )
+    header += b" " * (-(len(header) + 8) % 4)
+    parts = [
+        np.array([len(header), count], dtype="<u4").tobytes(),
+        header,
+        np.asarray(columns["id"], dtype="<u4").tobytes(),
+        np.asarray(columns["tick_id"], dtype="<u4").tobytes(),
+    ]
+    for key in ("x", "y", "x_ground", "y_ground"):
+        parts.append(np.asarray(columns[key], dtype="<f4").tobytes())
+    parts.append(color_idx.tobytes())
+    parts.append(type_idx.tobytes())
+    parts.append(icon_idx.tobytes())
+    parts.append(np.asarray(columns["is_poi"], dtype=np.uint8).tobytes())
+    return b"".join(parts)
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    """Return a 304 response when the client already holds this ETag."""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
 
+def _request_since_ms() -> int:
+    """Read the since query value in ms, accepting legacy float seconds.
 
-def _select_map_key(map_info: MapInfo, map_hash: str) -> Optional[str]:
+    Values outside SQLite's signed 64-bit integer range fall back to 0.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        raw_value = request.args.get("since")
+        if not raw_value:
+            return 0
+        try:
+            since = int(float(raw_value) * 1000)
+        except (ValueError, OverflowError):
+            return 0
+    if not -(2**63) <= since < 2**63:
+        return 0
+    return since
+
+
+@lru_cache(maxsize=None)
+def _select_map_key(map_id: Optional[str], map_hash: str) -> Optional[str]:
     """Resolve the map image key for image lookups."""
-    map_id = map_info.map_id
     if map_id in (None, *MAP_DEFAULTS.invalid_map_ids):
         return map_hash or None
     return map_id
 
 
+@lru_cache(maxsize=MAP_IMAGE_CACHE_SIZE)
+def _load_map_image(map_key: str) -> Tuple[bytes, str]:
+    """Read a map PNG once and return its bytes with a content ETag.
+
+    Map files are written once and never replaced, so cached entries do not
+    go stale; missing files raise and are therefore retried on later calls.
+    """
+    # safe_join rejects separators or ".." so a bad key cannot escape MAPS_DIR.
+    path = safe_join(str(MAPS_DIR), f"{map_key}.png")
+    if path is None:
+        raise FileNotFoundError(map_key)
+    with open(path, "rb") as handle:
+        data = handle.read()
+    return data, generate_etag(data)
+
+
 def _register_template_filters(app: Flask) -> None:
     """Register template filters used by the views."""
 
@@ -128,20 +258,52 @@ def _register_template_filters(app: Flask) -> None:
         return _format_datetime(value)
 
 
-def _register_routes(app: Flask, conn: sqlite3.Connection) -> None:
+def _precompile_templates(app: Flask) -> None:
+    """Compile page templates at startup, caching bytecode across restarts."""
+    try:
+        PATHS.jinja_cache_dir.mkdir(parents=True, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            str(PATHS.jinja_cache_dir)
+        )
+    except OSError as e:
+        logger.debug("Template bytecode cache unavailable: %s", e)
+    for name in TEMPLATE_NAMES:
+        app.jinja_env.get_template(name)
+
+
+def _register_routes(
+    app: Flask,
+    pool: db.ConnectionPool,
+    writer: sqlite3.Connection,
+) -> None:
     """Register web and API routes for the Flask application."""
 
     @app.route("/")
     def index() -> str:
         """Render the dashboard listing all matches."""
-        matches = db.get_all_matches(conn)
-        match_data = [_build_match_summary(match, conn) for match in matches]
-        return render_template("index.html", matches=match_data)
+        with pool.acquire() as conn:
+            last_id, total, active_id, active_count = db.get_matches_version(conn)
+            cache_key = (
+                last_id,
+                total,
+                active_id,
+                (active_count or 0) // INDEX_COUNT_BUCKET,
+            )
+            cached = _INDEX_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+            matches = db.get_all_matches(conn)
+        match_data = [_build_match_summary(match) for match in matches]
+        html = render_template("index.html", matches=match_data)
+        _INDEX_CACHE.clear()
+        _INDEX_CACHE[cache_key] = html
+        return html
 
     @app.route("/match/<int:match_id>")
     def match_view(match_id: int):
         """Render a specific match view."""
-        match = db.get_match(conn, match_id)
+        with pool.acquire() as conn:
+            match = db.get_match(conn, match_id)
         if not match:
             return "Match not found", 404
         is_live = match.ended_at is None
@@ -150,7 +312,8 @@ def _register_routes(app: Flask, conn: sqlite3.Connection) -> None:
     @app.route("/live")
     def live_view():
         """Render the live view or waiting screen."""
-        active = db.get_active_match(conn)
+        with pool.acquire() as conn:
+            active = db.get_active_match(conn)
         if active:
             return render_template("match.html", match=active, is_live=True)
         return render_template("waiting.html")
@@ -158,48 +321,108 @@ def _register_routes(app: Flask, conn: sqlite3.Connection) -> None:
     @app.route("/api/matches")
     def api_matches():
         """Return the list of matches as JSON."""
-        matches = db.get_all_matches(conn)
-        payload = [_build_match_payload(match, conn) for match in matches]
-        return jsonify(payload)
+        with pool.acquire() as conn:
+            version = db.get_matches_version(conn)
+            etag = "matches-" + "-".join(str(part) for part in version)
+            not_modified = _not_modified(etag)
+            if not_modified is not None:
+                return not_modified
+            body = _MATCHES_CACHE.get(version)
+            if body is None:
+                matches = db.get_all_matches(conn)
+        if body is None:
+            payload = [_build_match_payload(match) for match in matches]
+            body = orjson.dumps(payload, option=OrjsonProvider.option)
+            _MATCHES_CACHE.clear()
+            _MATCHES_CACHE[version] = body
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
 
     @app.route("/api/match/<int:match_id>")
     def api_match(match_id: int):
         """Return match details as JSON."""
-        match = db.get_match(conn, match_id)
+        with pool.acquire() as conn:
+            match = db.get_match(conn, match_id)
         if not match:
             return jsonify({"error": "Not found"}), 404
         return jsonify(_build_match_detail_payload(match))
 
+    def _positions_response(match_id: int, binary: bool) -> Response:
+        """Load the positions bundle and encode it, honoring If-None-Match."""
+        since = _request_since_ms()
+        with pool.acquire() as conn:
+            latest_ts = db.get_latest_tick_timestamp(conn, match_id)
+            etag = f"{match_id}-{since}-{latest_ts}{'-bin' if binary else ''}"
+            not_modified = _not_modified(etag)
+            if not_modified is not None:
+                return not_modified
+            bundle = db.get_positions_bundle(conn, match_id, since_ts_ms=since)
+        if binary:
+            response = Response(
+                _encode_positions_binary(bundle),
+                mimetype="application/octet-stream",
+            )
+        else:
+            response = jsonify(bundle)
+        response.set_etag(etag)
+        return response
+
     @app.route("/api/match/<int:match_id>/positions")
     def api_positions(match_id: int):
         """Return positions for a match as JSON."""
-        since_raw = request.args.get("since", "0")
-        try:
-            since = _parse_since_ms(since_raw)
-        except (ValueError, TypeError):
-            since = 0
-        bundle = db.get_positions_bundle(conn, match_id, since_ts_ms=since)
-        return jsonify(bundle)
+        return _positions_response(match_id, binary=False)
+
+    @app.route("/api/match/<int:match_id>/positions.bin")
+    def api_positions_binary(match_id: int):
+        """Return positions for a match in the packed binary layout."""
+        return _positions_response(match_id, binary=True)
+
+    @app.route("/api/match/<int:match_id>/positions.ndjson")
+    def api_positions_ndjson(match_id: int):
+        """Stream positions for a match as newline-delimited JSON."""
+        since = _request_since_ms()
+
+        def generate():
+            # The pooled connection is held only while the stream is consumed
+            # and is returned even if the client disconnects mid-way.
+            with pool.acquire() as conn:
+                for batch in db.iter_position_rows(conn, match_id, since):
+                    yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+
+        return Response(generate(), mimetype="application/x-ndjson")
 
     @app.route("/api/match/<int:match_id>/map.png")
     def api_map_image(match_id: int):
         """Return the map image for a match."""
-        match = db.get_match(conn, match_id)
+        with pool.acquire() as conn:
+            match = db.get_match(conn, match_id)
         if not match:
             return "", 404
         map_info = _resolve_map_info(match.map_hash)
-        map_key = _select_map_key(map_info, match.map_hash)
+        map_key = _select_map_key(map_info.map_id, match.map_hash)
         if not map_key:
             return "", 404
-        map_path = MAPS_DIR / f"{map_key}.png"
-        if not map_path.exists():
+        try:
+            data, etag = _load_map_image(map_key)
+        except OSError:
             return "", 404
-        return Response(map_path.read_bytes(), mimetype="image/png")
+        not_modified = _not_modified(etag)
+        if not_modified is None:
+            response = Response(data, mimetype="image/png")
+            response.set_etag(etag)
+        else:
+            response = not_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_IMAGE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
 
     @app.route("/api/active")
     def api_active():
         """Return the active match metadata if present."""
-        active = db.get_active_match(conn)
+        with pool.acquire() as conn:
+            active = db.get_active_match(conn)
         if not active:
             return jsonify(None)
         return jsonify(
@@ -213,34 +436,55 @@ def _register_routes(app: Flask, conn: sqlite3.Connection) -> None:
     @app.route("/api/status")
     def api_status():
         """Return capture status metadata."""
+        with _STATUS_LOCK:
+            if time.monotonic() < _STATUS_CACHE["expires"]:
+                body, etag = _STATUS_CACHE["body"], _STATUS_CACHE["etag"]
+            else:
+                body, etag = _build_status_body()
+                _STATUS_CACHE["expires"] = time.monotonic() + STATUS_CACHE_SECONDS
+                _STATUS_CACHE["body"] = body
+                _STATUS_CACHE["etag"] = etag
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
+
+    def _build_status_body() -> Tuple[bytes, str]:
+        """Build the encoded status payload and its ETag."""
         capturer = capture.get_capturer()
-        active = db.get_active_match(conn)
-        army_type = getattr(capturer, "current_army_type", CAPTURE_DEFAULTS.army_type)
-        vehicle_type = getattr(capturer, "current_vehicle_type", CAPTURE_DEFAULTS.vehicle_type)
-        if active and (not army_type or not vehicle_type):
-            latest_tick = db.get_latest_tick(conn, active.id)
-            if latest_tick:
-                army_type = army_type or latest_tick.army_type
-                vehicle_type = vehicle_type or latest_tick.vehicle_type
-        return jsonify(
-            {
-                "capturing": capturer.running,
-                "active_match_id": active.id if active else None,
-                "army_type": army_type or CAPTURE_DEFAULTS.army_type,
-                "vehicle_type": vehicle_type or CAPTURE_DEFAULTS.vehicle_type,
-            }
-        )
+        army_type = capturer.current_army_type
+        vehicle_type = capturer.current_vehicle_type
+        with pool.acquire() as conn:
+            active = db.get_active_match(conn)
+            if active and (not army_type or not vehicle_type):
+                latest_tick = db.get_latest_tick(conn, active.id)
+                if latest_tick:
+                    army_type = army_type or latest_tick.army_type
+                    vehicle_type = vehicle_type or latest_tick.vehicle_type
+        payload = {
+            "capturing": capturer.running,
+            "active_match_id": active.id if active else None,
+            "army_type": army_type or CAPTURE_DEFAULTS.army_type,
+            "vehicle_type": vehicle_type or CAPTURE_DEFAULTS.vehicle_type,
+        }
+        body = orjson.dumps(payload, option=OrjsonProvider.option)
+        return body, generate_etag(body)
 
     @app.route("/api/match/<int:match_id>", methods=["DELETE"])
     def api_delete_match(match_id: int):
         """Delete a match and all its positions."""
-        match = db.get_match(conn, match_id)
+        with pool.acquire() as conn:
+            match = db.get_match(conn, match_id)
+            active = db.get_active_match(conn)
         if not match:
             return jsonify({"error": "Not found"}), 404
-        active = db.get_active_match(conn)
         if active and active.id == match_id:
             return jsonify({"error": "Cannot delete active match"}), 400
-        db.delete_match(conn, match_id)
+        db.delete_match(writer, match_id)
+        _INDEX_CACHE.clear()
+        _MATCHES_CACHE.clear()
         return jsonify({"success": True})
 
     @app.route("/shutdown", methods=["POST"])
@@ -264,15 +508,19 @@ def _register_routes(app: Flask, conn: sqlite3.Connection) -> None:
 def create_app() -> Flask:
     """Create and configure the Flask application."""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
     _register_template_filters(app)
-    conn = db.get_connection()
-    orphaned = db.close_orphaned_matches(conn)
+    _precompile_templates(app)
+    writer = db.get_connection()
+    orphaned = db.close_orphaned_matches(writer)
     if orphaned:
         logger.info(
             "Closed %s orphaned match(es) from previous session",
             orphaned,
         )
-    _register_routes(app, conn)
+    pool = db.ConnectionPool()
+    _register_routes(app, pool, writer)
     return app
 
 
@@ -296,6 +544,20 @@ def _maybe_open_browser(host: str, port: int, path: str = "") -> None:
         logger.debug("Failed to open browser for %s", url)
 
 
+def _run_server(app: Flask, host: str, port: int, dev: bool) -> None:
+    """Serve the app with waitress, or the Werkzeug dev server when asked."""
+    if dev:
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+    waitress.serve(
+        app,
+        host=host,
+        port=port,
+        threads=APP_SETTINGS.server_threads,
+        channel_timeout=APP_SETTINGS.server_channel_timeout,
+    )
+
+
 def _another_instance_running(host: str, port: int) -> bool:
     """Return True if a WT Plotter server is already reachable."""
     try:
@@ -308,7 +570,8 @@ def _another_instance_running(host: str, port: int) -> bool:
 @cli.command()
 @click.option("--port", default=APP_SETTINGS.port, help="Port to run the server on")
 @click.option("--host", default=APP_SETTINGS.host, help="Host to bind to")
-def serve(port: int, host: str) -> None:
+@click.option("--dev", is_flag=True, help="Use the Flask development server")
+def serve(port: int, host: str, dev: bool) -> None:
     """Start the web server only (no capture)."""
     app = create_app()
     logger.info("Starting web server on http://%s:%s", host, port)
@@ -317,7 +580,7 @@ def serve(port: int, host: str) -> None:
         tray.start_tray(host, port)
     except Exception:
         logger.debug("Tray failed to start")
-    app.run(host=host, port=port, debug=False, threaded=True)
+    _run_server(app, host, port, dev)
     try:
         tray.stop_tray()
     except Exception:
@@ -336,7 +599,7 @@ def capture_cmd() -> None:
     def on_end(match_id: int) -> None:
         logger.info("Match %s ended", match_id)
 
-    def on_position(match_id: int, positions: list[dict]) -> None:
+    def on_position(match_id: int, positions: List[PositionEntry]) -> None:
         logger.info("Match %s: captured %s positions", match_id, len(positions))
 
     capturer = capture.Capturer(
@@ -349,21 +612,23 @@ def capture_cmd() -> None:
     except Exception:
         pass
 
-    try:
-        capturer.start()
-        while True:
-            import time
-
-            time.sleep(1)
-    except KeyboardInterrupt:
-        capturer.stop()
-        logger.info("Capture stopped")
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    capturer.start()
+    # POSIX interrupts the blocking wait on SIGINT; Windows only runs signal
+    # handlers between bytecodes, so it wakes periodically to notice Ctrl+C.
+    wait_timeout = CTRL_C_POLL_SECONDS if os.name == "nt" else None
+    while not stop_event.wait(wait_timeout):
+        pass
+    capturer.stop()
+    logger.info("Capture stopped")
 
 
 @cli.command()
 @click.option("--port", default=APP_SETTINGS.port, help="Port to run the server on")
 @click.option("--host", default=APP_SETTINGS.host, help="Host to bind to")
-def watch(port: int, host: str) -> None:
+@click.option("--dev", is_flag=True, help="Use the Flask development server")
+def watch(port: int, host: str, dev: bool) -> None:
     """Start both capture and web server."""
     logger.info("Starting watch mode (capture + web server)")
 
@@ -373,8 +638,8 @@ def watch(port: int, host: str) -> None:
     def on_end(match_id: int) -> None:
         logger.info("Match %s ended", match_id)
 
-    def on_position(match_id: int, positions: list[dict]) -> None:
-        regular = [pos for pos in positions if not pos.get("is_poi")]
+    def on_position(match_id: int, positions: List[PositionEntry]) -> None:
+        regular = [pos for pos in positions if not pos.is_poi]
         if regular:
             logger.info("Match %s: +%s positions", match_id, len(regular))
 
@@ -399,7 +664,7 @@ def watch(port: int, host: str) -> None:
         logger.debug("Tray failed to start")
 
     try:
-        app.run(host=host, port=port, debug=False, threaded=True)
+        _run_server(app, host, port, dev)
     finally:
         capturer.stop()
         try:
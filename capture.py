@@ -1,22 +1,27 @@
 """
 Capture module for WT Plotter.
-Uses requests and aiohttp to poll the localhost telemetry API.
+Uses a pooled requests session to poll the localhost telemetry API.
 """
 from __future__ import annotations
 
-import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 import hashlib
-import json
+import io
 import logging
+import os
+from pathlib import Path
+import queue
 import re
+import sqlite3
 import threading
 import time
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple
 
-import aiohttp
 import numpy as np
+import orjson
+from PIL import Image
 import requests
 from requests.adapters import HTTPAdapter
 
@@ -37,6 +42,18 @@ from models import PositionEntry
 SAVE_RAW_DATA = CAPTURE_SETTINGS.save_raw_data
 RAW_DATA_DIR = PATHS.raw_dir
 MAPS_DIR = PATHS.maps_dir
+_MAP_NAME_PREFIX_RE = re.compile(r"^[^A-Za-z0-9]+")
+_POI_TYPES = frozenset(CAPTURE_FILTERS.poi_types)
+# POI types skipped once the POI snapshot is stored; zones are re-captured.
+_POI_SKIP_TYPES = _POI_TYPES - {CAPTURE_FILTERS.capture_zone_type}
+_AIR_DEFENCE_ICONS = frozenset(CAPTURE_FILTERS.air_defence_icons)
+# Lower-cased icons and types never used as air transform anchors.
+_TRANSFORM_EXCLUDED_ICONS = frozenset(
+    icon.lower() for icon in CAPTURE_FILTERS.excluded_icons
+)
+_TRANSFORM_EXCLUDED_TYPES = frozenset(
+    obj_type.lower() for obj_type in CAPTURE_FILTERS.excluded_types
+)
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +63,8 @@ class MatchState:
     """Capture state tied to the active match lifecycle."""
 
     current_match_id: Optional[int] = None
+    # Timing fields hold time.monotonic() readings; tick timestamps are
+    # stored as offsets from match_start_time, so wall-clock jumps are moot.
     match_start_time: float = 0.0
     poi_captured: bool = False
     has_map_image: bool = False
@@ -60,6 +79,8 @@ class MatchState:
     prev_tick_was_air_view: bool = False
     air_transform_computed: bool = False
     air_transform_params: Optional[Tuple[float, float, float, float]] = None
+    last_air_map_probe: float = 0.0
+    air_map_probe: Optional[Future] = None
 
 
 @dataclass
@@ -77,7 +98,7 @@ class Capturer:
         self,
         on_match_start: Optional[Callable[[int], None]] = None,
         on_match_end: Optional[Callable[[int], None]] = None,
-        on_position: Optional[Callable[[int, List[dict]], None]] = None,
+        on_position: Optional[Callable[[int, List[PositionEntry]], None]] = None,
     ):
         self.conn = db.get_connection()
         self.running = False
@@ -86,9 +107,14 @@ class Capturer:
         self.state = MatchState()
         self.live = LiveState()
 
-        self.raw_data: List[Dict[str, Any]] = []
+        # Raw responses are streamed to an NDJSON file per match instead of
+        # being held in memory until the match ends.
+        self._raw_file: Optional[BinaryIO] = None
+        self._raw_path: Optional[Path] = None
+        self._raw_tick_count = 0
         if SAVE_RAW_DATA:
             RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        MAPS_DIR.mkdir(parents=True, exist_ok=True)
 
         self.on_match_start = on_match_start
         self.on_match_end = on_match_end
@@ -96,41 +122,164 @@ class Capturer:
 
         self.session = requests.Session()
         self.session.timeout = CAPTURE_TIMEOUTS.session
-        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        # One keep-alive socket per concurrent poll, plus one for the map image
+        # probe, so requests fetched in parallel never wait on each other for
+        # a pooled connection.
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, CAPTURE_SETTINGS.poll_workers) + 1,
+            max_retries=0,
+        )
         self.session.mount(CAPTURE_ENDPOINTS.base_url, adapter)
         self.session.headers.update({"Connection": "keep-alive"})
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Air map probes (download and dhash) and map image writes run here so
+        # they never hold up a capture tick.
+        self._map_image_pool: Optional[ThreadPoolExecutor] = None
+        # Map keys already on disk or queued for writing this session.
+        self._saved_map_keys: Set[str] = set()
+        # (match_id, tick, rows) batches are written by a dedicated thread on
+        # its own connection so a slow commit never delays the next poll.
+        self._db_queue: queue.Queue = queue.Queue()
+        self._db_thread: Optional[threading.Thread] = None
+        # Last raw body and decoded value per slowly-changing endpoint.
+        self._response_cache: Dict[str, Tuple[bytes, Any]] = {}
+        # Last (image bytes, size, hash) so re-polling an unchanged map image
+        # during grace checks skips the decode and resize.
+        self._last_dhash: Optional[Tuple[bytes, int, str]] = None
     
     def start(self) -> None:
         """Start the capture loop in a background thread."""
         if self.running:
             return
         self.running = True
+        self._db_thread = threading.Thread(target=self._db_writer, daemon=True)
+        self._db_thread.start()
         self.thread = threading.Thread(target=self._loop, daemon=True)
         self.thread.start()
         logger.info("Capture started")
     
     def stop(self) -> None:
-        """Stop the capture loop."""
+        """Stop the capture loop and flush pending position writes."""
         self.running = False
         if self.thread:
             self.thread.join(timeout=CAPTURE_TIMEOUTS.thread_join)
+        if self._db_thread:
+            self._db_queue.put(None)
+            self._db_thread.join(timeout=CAPTURE_TIMEOUTS.thread_join)
+            self._db_thread = None
+        self._close_raw_file()
         logger.info("Capture stopped")
+
+    def _db_writer(self) -> None:
+        """Drain queued position batches into the database until stopped."""
+        conn = db.get_connection()
+        batch_max = max(1, CAPTURE_SETTINGS.db_write_batch_max)
+        try:
+            stopping = False
+            while not stopping:
+                item = self._db_queue.get()
+                if item is None:
+                    return
+                # Ticks that queued up behind a slow commit are written
+                # together in one transaction so the writer catches up.
+                batch = [item]
+                while len(batch) < batch_max:
+                    try:
+                        item = self._db_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._write_position_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _write_position_batch(
+        self,
+        conn: sqlite3.Connection,
+        batch: List[Tuple[int, db.TickInput, List[db.PositionRow]]],
+    ) -> None:
+        """Write queued batches, retrying one by one if the transaction fails."""
+        try:
+            db.add_position_batches(conn, batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logger.warning("Failed to store positions: %s", e)
+                return
+        for match_id, tick, rows in batch:
+            try:
+                db.add_positions(conn, match_id, tick, rows)
+            except Exception as e:
+                logger.warning("Failed to store positions: %s", e)
+
+    def _store_positions(
+        self,
+        match_id: int,
+        positions: List[PositionEntry],
+    ) -> None:
+        """Queue positions for the writer thread, or write inline without one."""
+        tick = positions[0].to_tick()
+        rows = [pos.to_row() for pos in positions]
+        if self._db_thread is not None and self._db_thread.is_alive():
+            self._db_queue.put((match_id, tick, rows))
+            return
+        db.add_positions(self.conn, match_id, tick, rows)
     
     def _loop(self) -> None:
         """Main capture loop running at the configured poll interval."""
-        while self.running:
-            try:
-                self._tick()
-            except Exception as e:
-                logger.error("Capture error: %s", e)
-            time.sleep(CAPTURE_SETTINGS.poll_interval)
+        # With a single worker the endpoints are fetched back to back on one
+        # keep-alive socket, without handing off to another thread.
+        if CAPTURE_SETTINGS.poll_workers > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=CAPTURE_SETTINGS.poll_workers,
+                thread_name_prefix="capture-poll",
+            )
+        self._map_image_pool = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="capture-map-image",
+        )
+        interval = CAPTURE_SETTINGS.poll_interval
+        next_deadline = time.monotonic()
+        try:
+            while self.running:
+                try:
+                    self._tick()
+                except Exception as e:
+                    logger.error("Capture error: %s", e)
+                # Sleep to a fixed cadence rather than a fixed gap so tick
+                # duration does not stretch the poll period; after an overrun
+                # the schedule restarts instead of firing a burst of ticks.
+                next_deadline += interval
+                delay = next_deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_deadline = time.monotonic()
+        finally:
+            executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=False)
+            map_image_pool, self._map_image_pool = self._map_image_pool, None
+            if map_image_pool is not None:
+                map_image_pool.shutdown(wait=False)
+
+    def _fetch_concurrently(self, *fetchers: Callable[[], Any]) -> List[Any]:
+        """Run endpoint fetchers on the poll executor and return their results."""
+        if self._executor is None:
+            return [fetch() for fetch in fetchers]
+        futures = [self._executor.submit(fetch) for fetch in fetchers]
+        return [future.result() for future in futures]
     
     def _tick(self) -> None:
         """Run a single capture tick using a map-validity state machine."""
         map_info, indicators_data, map_obj_data = self._fetch_tick_data()
         match_running = map_info.get("valid", False) if map_info else False
         if not self.state.has_map_image and match_running:
-            self._start_match()
+            self._start_match(map_info, indicators_data, map_obj_data)
             return
         if self.state.has_map_image and match_running:
             self._handle_running_match(indicators_data, map_obj_data)
@@ -142,17 +291,12 @@ class Capturer:
         self,
     ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
         """Fetch map info, indicators, and map objects concurrently."""
-
-        async def fetch_all():
-            async with aiohttp.ClientSession() as session:
-                tasks = [
-                    self._get_map_info_async(session),
-                    self._get_indicators_data_async(session),
-                    self._get_map_obj_data_async(session),
-                ]
-                return await asyncio.gather(*tasks)
-
-        return asyncio.run(fetch_all())
+        map_info, indicators_data, map_obj_data = self._fetch_concurrently(
+            self._get_map_info,
+            self._get_indicators_data,
+            self._get_map_obj_data,
+        )
+        return map_info, indicators_data, map_obj_data
 
     def _handle_running_match(
         self,
@@ -206,7 +350,7 @@ class Capturer:
 
     def _maybe_end_match_after_grace(self) -> None:
         """Start or complete the grace period for ending a match."""
-        current_time = time.time()
+        current_time = time.monotonic()
         if self.state.match_end_grace_start is None:
             self.state.match_end_grace_start = current_time
             logger.info(
@@ -224,67 +368,86 @@ class Capturer:
             )
             self._end_match()
     
-    async def _get_map_info_async(
-        self,
-        session: aiohttp.ClientSession,
-    ) -> Optional[Dict[str, Any]]:
-        """Get current map_info.json data asynchronously."""
+    def _get_map_info(self) -> Optional[Dict[str, Any]]:
+        """Get current map_info.json data."""
         try:
             logger.debug("Getting map info from map_info.json endpoint")
-            async with session.get(
+            resp = self.session.get(
                 CAPTURE_ENDPOINTS.map_info_url,
-                timeout=aiohttp.ClientTimeout(total=CAPTURE_TIMEOUTS.async_map_info),
-            ) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+                timeout=CAPTURE_TIMEOUTS.poll_map_info,
+            )
+            if resp.status_code == 200:
+                return self._decode_unless_unchanged(
+                    CAPTURE_ENDPOINTS.map_info_url,
+                    resp.content,
+                )
         except Exception as e:
             logger.warning("Failed to get map info: %s", e)
         return None
 
-    async def _get_indicators_data_async(
-        self,
-        session: aiohttp.ClientSession,
-    ) -> Optional[Dict[str, Any]]:
-        """Get indicators data asynchronously."""
+    def _get_indicators_data(self) -> Optional[Dict[str, Any]]:
+        """Get indicators data."""
         try:
             logger.debug("Getting indicators data from indicators endpoint")
-            async with session.get(
+            resp = self.session.get(
                 CAPTURE_ENDPOINTS.indicators_url,
-                timeout=aiohttp.ClientTimeout(total=CAPTURE_TIMEOUTS.async_indicators),
-            ) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+                timeout=CAPTURE_TIMEOUTS.poll_indicators,
+            )
+            if resp.status_code == 200:
+                return self._decode_unless_unchanged(
+                    CAPTURE_ENDPOINTS.indicators_url,
+                    resp.content,
+                )
         except Exception as e:
             logger.warning("Failed to get indicators data: %s", e)
         return None
 
-    async def _get_map_obj_data_async(
-        self,
-        session: aiohttp.ClientSession,
-    ) -> Optional[List[Dict[str, Any]]]:
-        """Get map objects data asynchronously."""
+    def _decode_unless_unchanged(self, key: str, content: bytes) -> Any:
+        """Decode a JSON body, reusing the last result when the bytes match.
+
+        The returned value is shared between ticks and must not be mutated.
+        """
+        cached = self._response_cache.get(key)
+        if cached is not None and cached[0] == content:
+            return cached[1]
+        data = orjson.loads(content)
+        self._response_cache[key] = (content, data)
+        return data
+
+    def _get_map_obj_data(self) -> Optional[List[Dict[str, Any]]]:
+        """Get map objects data."""
         try:
             logger.debug("Getting map objects data from map_obj.json endpoint")
-            async with session.get(
+            resp = self.session.get(
                 CAPTURE_ENDPOINTS.map_obj_url,
-                timeout=aiohttp.ClientTimeout(total=CAPTURE_TIMEOUTS.async_map_obj),
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if isinstance(data, list):
-                        return data
+                timeout=CAPTURE_TIMEOUTS.poll_map_obj,
+            )
+            if resp.status_code == 200:
+                data = orjson.loads(resp.content)
+                if isinstance(data, list):
+                    return data
         except Exception as e:
             logger.warning("Failed to get map objects data: %s", e)
         return None
     
-    def _start_match(self) -> None:
-        """Start tracking a new match."""
+    def _start_match(
+        self,
+        map_info_data: Optional[Dict[str, Any]] = None,
+        indicators_data: Optional[Dict[str, Any]] = None,
+        map_obj_data: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Start tracking a new match.
+
+        The optional payloads are the ones the caller already polled this tick.
+        map_info_data only feeds raw data dumps, so it is fetched here only
+        when raw data is being saved; indicators and map objects are fetched
+        only when the caller has neither.
+        """
         logger.info("Match started - loading map")
-        self.state.match_start_time = time.time()
+        self.state.match_start_time = time.monotonic()
         self.state.poi_captured = False
         self.state.has_map_image = True
         self.state.match_end_grace_start = None
-        self.raw_data = []
 
         map_hash = ""
         map_image = None
@@ -292,23 +455,16 @@ class Capturer:
         map_id = None
         map_info: Optional[MapInfo] = None
 
-        try:
-            resp = self.session.get(
-                CAPTURE_ENDPOINTS.map_info_url,
-                timeout=CAPTURE_TIMEOUTS.map_info,
-            )
-            if resp.status_code == 200:
-                map_info = resp.json()
-                if SAVE_RAW_DATA:
-                    self.raw_data.append(
-                        {
-                            "endpoint": "map_info.json",
-                            "timestamp": 0,
-                            "data": map_info,
-                        }
-                    )
-        except Exception as e:
-            logger.debug("Failed to capture map_info.json: %s", e)
+        if map_info_data is None and SAVE_RAW_DATA:
+            try:
+                resp = self.session.get(
+                    CAPTURE_ENDPOINTS.map_info_url,
+                    timeout=CAPTURE_TIMEOUTS.map_info,
+                )
+                if resp.status_code == 200:
+                    map_info_data = orjson.loads(resp.content)
+            except Exception as e:
+                logger.debug("Failed to capture map_info.json: %s", e)
 
         try:
             resp = self.session.get(
@@ -331,9 +487,15 @@ class Capturer:
             logger.warning("Failed to get map image: %s", e)
 
         if map_image:
-            self._save_map_image(map_image, map_id, map_hash)
+            # The match becomes visible to the viewer once its row exists,
+            # so the map file must already be on disk by then.
+            self._save_map_image(map_image, map_id, map_hash, background=False)
 
         self.state.current_match_id = db.start_match(self.conn, map_hash=map_hash)
+        if SAVE_RAW_DATA:
+            self._open_raw_file()
+            if map_info_data is not None:
+                self._append_raw("map_info.json", 0, map_info_data)
         self.state.current_map_hash = map_hash
         self.state.current_map_info = map_info
         self.state.current_air_map_hash = ""
@@ -344,29 +506,23 @@ class Capturer:
         self.state.prev_tick_was_air_view = False
         self.state.air_transform_computed = False
         self.state.air_transform_params = None
+        self.state.last_air_map_probe = 0.0
+        self.state.air_map_probe = None
         
         if self.on_match_start and self.state.current_match_id is not None:
             self.on_match_start(self.state.current_match_id)
 
-        async def fetch_initial():
-            """Fetch indicators and map objects for the first capture tick."""
-            async with aiohttp.ClientSession() as session:
-                indicators_task = self._get_indicators_data_async(session)
-                map_obj_task = self._get_map_obj_data_async(session)
-                indicators_data, map_obj_data = await asyncio.gather(
-                    indicators_task,
-                    map_obj_task,
-                )
-                return indicators_data, map_obj_data
-
-        indicators_data, map_obj_data = asyncio.run(fetch_initial())
+        if indicators_data is None and map_obj_data is None:
+            indicators_data, map_obj_data = self._fetch_concurrently(
+                self._get_indicators_data,
+                self._get_map_obj_data,
+            )
         self._capture_positions_with_data(indicators_data, map_obj_data)
 
     def _end_match(self) -> None:
         """End the current match."""
 
-        if SAVE_RAW_DATA and self.state.current_match_id and self.raw_data:
-            self._save_raw_data()
+        self._close_raw_file()
 
         if self.state.current_match_id:
             db.end_match(self.conn, self.state.current_match_id)
@@ -381,13 +537,14 @@ class Capturer:
         self.state.current_map_info = None
         self.state.current_air_map_hash = ""
         self.state.last_poi_signature = None
-        self.raw_data = []
         self.state.match_nuke_detected = False
         self.state.initial_capture_set = False
         self.state.prev_tick_ground_objects = []
         self.state.prev_tick_was_air_view = False
         self.state.air_transform_computed = False
         self.state.air_transform_params = None
+        self.state.last_air_map_probe = 0.0
+        self.state.air_map_probe = None
     
     def _capture_positions_with_data(
         self,
@@ -409,36 +566,34 @@ class Capturer:
             if vehicle_type:
                 self.live.vehicle_type = vehicle_type
             self._maybe_capture_air_map(army_type)
-            poi_changed, airdefence_seen, capture_zone_positions = (
-                self._scan_poi_and_airdefence(objects)
-            )
+            (
+                valid_objects,
+                poi_changed,
+                airdefence_seen,
+                capture_zone_positions,
+            ) = self._scan_poi_and_airdefence(objects)
             self._maybe_set_initial_capture(capture_zone_positions)
-            timestamp = time.time() - self.state.match_start_time
+            timestamp = time.monotonic() - self.state.match_start_time
             is_air_view_now = self._is_air_view_now(
                 army_type,
                 airdefence_seen,
                 poi_changed,
             )
             self._maybe_store_air_transform(is_air_view_now, objects)
-            self._update_previous_tick(is_air_view_now, objects)
+            self._update_previous_tick(is_air_view_now, valid_objects)
             self._maybe_store_raw_tick(timestamp, objects, indicators_data)
             positions = self._build_positions(
-                objects,
+                valid_objects,
                 timestamp,
                 army_type,
                 vehicle_type,
                 is_air_view_now,
             )
             if positions:
-                payload_positions = [pos.to_dict() for pos in positions]
                 logger.debug("Captured %s positions", len(positions))
-                db.add_positions(
-                    self.conn,
-                    self.state.current_match_id,
-                    payload_positions,
-                )
+                self._store_positions(self.state.current_match_id, positions)
                 if self.on_position:
-                    self.on_position(self.state.current_match_id, payload_positions)
+                    self.on_position(self.state.current_match_id, positions)
             if any(pos.is_poi for pos in positions):
                 self.state.poi_captured = True
             logger.debug("Finished capturing positions")
@@ -460,29 +615,42 @@ class Capturer:
     def _scan_poi_and_airdefence(
         self,
         objects: List[Dict[str, Any]],
-    ) -> Tuple[bool, bool, List[Tuple[float, float]]]:
-        """Return POI-change flag, air-defence flag, and capture zones."""
+    ) -> Tuple[
+        List[Dict[str, Any]], bool, bool, List[Tuple[float, float]]
+    ]:
+        """Return in-bounds objects, POI/air-defence flags, and capture zones.
+
+        This is the only pass that bounds-checks the tick's objects; later
+        steps work from the returned in-bounds list.
+        """
+        valid_objects: List[Dict[str, Any]] = []
+        keep = valid_objects.append
         poi_signature_list: List[Tuple[Any, ...]] = []
         capture_zone_positions: List[Tuple[float, float]] = []
         airdefence_seen = False
+        coord_min = CAPTURE_SETTINGS.valid_coord_min
+        coord_max = CAPTURE_SETTINGS.valid_coord_max
+        capture_zone_type = CAPTURE_FILTERS.capture_zone_type
+        rounding = CAPTURE_SETTINGS.signature_rounding
         for obj in objects:
-            x = obj.get("x", -1)
-            y = obj.get("y", -1)
-            if not self._is_valid_coord(x, y):
+            # Objects nearly always carry both coordinates, so subscripting
+            # under a try is cheaper than two .get calls with defaults.
+            try:
+                x = obj["x"]
+                y = obj["y"]
+            except KeyError:
                 continue
-            icon = obj.get("icon", "")
-            if isinstance(icon, str) and icon.lower() in (
-                *CAPTURE_FILTERS.air_defence_icons,
-            ):
-                airdefence_seen = True
+            if not (coord_min < x < coord_max and coord_min < y < coord_max):
+                continue
+            keep(obj)
+            if not airdefence_seen:
+                icon = obj.get("icon", "")
+                if isinstance(icon, str) and icon.lower() in _AIR_DEFENCE_ICONS:
+                    airdefence_seen = True
             obj_type = obj.get("type", "unknown")
-            if obj_type == CAPTURE_FILTERS.capture_zone_type:
+            if obj_type == capture_zone_type:
                 poi_signature_list.append(
-                    (
-                        obj_type,
-                        round(x, CAPTURE_SETTINGS.signature_rounding),
-                        round(y, CAPTURE_SETTINGS.signature_rounding),
-                    )
+                    (obj_type, round(x, rounding), round(y, rounding))
                 )
                 capture_zone_positions.append((x, y))
         poi_signature_list.sort()
@@ -494,7 +662,7 @@ class Capturer:
         ):
             poi_changed = True
         self.state.last_poi_signature = poi_signature
-        return poi_changed, airdefence_seen, capture_zone_positions
+        return valid_objects, poi_changed, airdefence_seen, capture_zone_positions
 
     def _maybe_set_initial_capture(
         self,
@@ -572,15 +740,11 @@ class Capturer:
     def _update_previous_tick(
         self,
         is_air_view_now: bool,
-        objects: List[Dict[str, Any]],
+        valid_objects: List[Dict[str, Any]],
     ) -> None:
-        """Update cached state from the current capture tick."""
+        """Update cached state from the current tick's in-bounds objects."""
         self.state.prev_tick_was_air_view = is_air_view_now
-        self.state.prev_tick_ground_objects = [
-            obj
-            for obj in objects
-            if self._is_valid_coord(obj.get("x", -1), obj.get("y", -1))
-        ]
+        self.state.prev_tick_ground_objects = valid_objects
 
     def _maybe_store_raw_tick(
         self,
@@ -589,79 +753,75 @@ class Capturer:
         indicators_data: Optional[Dict[str, Any]],
     ) -> None:
         """Store raw tick data for debugging if enabled."""
-        if not SAVE_RAW_DATA:
+        if self._raw_file is None:
             return
         logger.debug("Saving raw map_obj.json data for debug")
-        self.raw_data.append(
-            {
-                "endpoint": "map_obj.json",
-                "timestamp": timestamp,
-                "data": objects,
-            }
-        )
+        self._append_raw("map_obj.json", timestamp, objects)
+        self._raw_tick_count += 1
         if indicators_data:
-            self.raw_data.append(
-                {
-                    "endpoint": "indicators",
-                    "timestamp": timestamp,
-                    "data": indicators_data,
-                }
-            )
+            self._append_raw("indicators", timestamp, indicators_data)
 
     def _build_positions(
         self,
-        objects: List[Dict[str, Any]],
+        valid_objects: List[Dict[str, Any]],
         timestamp: float,
         army_type: Optional[str],
         vehicle_type: Optional[str],
         is_air_view_now: bool,
     ) -> List[PositionEntry]:
-        """Build position entries for the current tick."""
-        positions: List[PositionEntry] = []
+        """Build position entries from the tick's in-bounds objects."""
         logger.debug("Processing map objects for position capture")
-        for obj in objects:
-            x = obj.get("x", -1)
-            y = obj.get("y", -1)
-            if not self._is_valid_coord(x, y):
-                continue
-            obj_type = obj.get("type", "unknown")
-            is_poi = obj_type in CAPTURE_FILTERS.poi_types
-            if (
-                is_poi
-                and obj_type != CAPTURE_FILTERS.capture_zone_type
-                and self.state.poi_captured
-            ):
+        # Everything below is constant for the tick, so resolve it once
+        # instead of per object.
+        poi_types = _POI_TYPES
+        skip_types = _POI_SKIP_TYPES if self.state.poi_captured else frozenset()
+        tick_army_type = army_type or CAPTURE_DEFAULTS.army_type
+        tick_vehicle_type = vehicle_type or CAPTURE_DEFAULTS.vehicle_type
+        is_player_air = 1 if army_type == CAPTURE_DEFAULTS.air_army_type else 0
+        is_player_air_view = 1 if is_air_view_now else 0
+        # Air-view points are mapped back to the ground frame with the
+        # match's (a, b, c, d) transform, unpacked once for the whole tick.
+        inverse = (
+            self._inverse_transform_params()
+            if is_air_view_now and self.state.air_transform_params
+            else None
+        )
+        if inverse is not None:
+            a, b, c, d = inverse
+
+        positions: List[PositionEntry] = []
+        append = positions.append
+        for obj in valid_objects:
+            get = obj.get
+            obj_type = get("type", "unknown")
+            if obj_type in skip_types:
                 continue
+            is_poi = obj_type in poi_types
+            x = obj["x"]
+            y = obj["y"]
+            if inverse is None:
+                x_ground = y_ground = None
+            else:
+                x_ground = (x - b) / a
+                y_ground = (y - d) / c
             pos = PositionEntry(
                 x=x,
                 y=y,
-                color=obj.get("color", "#FFFFFF"),
+                color=get("color", "#FFFFFF"),
                 obj_type=obj_type,
-                icon=obj.get("icon", "unknown"),
+                icon=get("icon", "unknown"),
                 timestamp=timestamp,
                 is_poi=1 if is_poi else 0,
-                army_type=army_type or CAPTURE_DEFAULTS.army_type,
-                vehicle_type=vehicle_type or CAPTURE_DEFAULTS.vehicle_type,
-                is_player_air=1
-                if army_type == CAPTURE_DEFAULTS.air_army_type
-                else 0,
-                is_player_air_view=1 if is_air_view_now else 0,
+                army_type=tick_army_type,
+                vehicle_type=tick_vehicle_type,
+                is_player_air=is_player_air,
+                is_player_air_view=is_player_air_view,
+                x_ground=x_ground,
+                y_ground=y_ground,
             )
-            if is_air_view_now and self.state.air_transform_params:
-                x_ground, y_ground = self._apply_inverse_transform(x, y)
-                pos.set_ground(x_ground, y_ground)
-            positions.append(pos)
+            append(pos)
         return positions
 
-    def _is_valid_coord(self, x: float, y: float) -> bool:
-        """Return True when coordinates are within valid bounds."""
-        return bool(
-            CAPTURE_SETTINGS.valid_coord_min < x < CAPTURE_SETTINGS.valid_coord_max
-            and CAPTURE_SETTINGS.valid_coord_min
-            < y
-            < CAPTURE_SETTINGS.valid_coord_max
-        )
-
     def _maybe_capture_air_map(self, army_type: Optional[str]) -> None:
         """Capture air map metadata when transitioning to air for ground battles."""
         if not self.state.current_match_id or not self.state.current_map_info:
@@ -672,8 +832,27 @@ class Capturer:
             return
         if self.state.current_map_info.battle_type == BattleType.AIR:
             return
+        probe = self.state.air_map_probe
+        if probe is None:
+            now = time.monotonic()
+            if now - self.state.last_air_map_probe < CAPTURE_SETTINGS.air_map_probe_interval:
+                return
+            self.state.last_air_map_probe = now
+            if self._map_image_pool is None:
+                map_image, map_hash = self._get_current_map_image_and_hash()
+            else:
+                # Collect the result on a later tick; match start/end drop
+                # the pending probe so a stale hash is never applied.
+                self.state.air_map_probe = self._map_image_pool.submit(
+                    self._get_current_map_image_and_hash
+                )
+                return
+        elif not probe.done():
+            return
+        else:
+            self.state.air_map_probe = None
+            map_image, map_hash = probe.result()
 
-        map_image, map_hash = self._get_current_map_image_and_hash()
         if not map_hash:
             return
         if map_hash == self.state.current_map_hash:
@@ -695,21 +874,46 @@ class Capturer:
         map_image: bytes,
         map_id: Optional[str],
         map_hash: Optional[str],
+        background: bool = True,
     ) -> None:
-        """Save the map image if it is not already on disk."""
+        """Save the map image if it is not already on disk.
+
+        With background set, the write is queued on the map image pool when
+        one is running; otherwise it completes before this returns.
+        """
         if not map_image:
             return
         if map_id in (None, *MAP_DEFAULTS.invalid_map_ids):
             map_key = map_hash or MAP_DEFAULTS.unknown_map_key
         else:
             map_key = map_id
-        MAPS_DIR.mkdir(parents=True, exist_ok=True)
+        if map_key in self._saved_map_keys:
+            return
+        self._saved_map_keys.add(map_key)
         file_path = MAPS_DIR / f"{map_key}.png"
+        pool = self._map_image_pool if background else None
+        if pool is None:
+            self._write_map_image(map_key, file_path, map_image)
+        else:
+            pool.submit(self._write_map_image, map_key, file_path, map_image)
+
+    def _write_map_image(
+        self, map_key: str, file_path: Path, map_image: bytes
+    ) -> None:
+        """Write a map PNG unless it exists, replacing it in one step.
+
+        The viewer caches map files as immutable, so it must never read a
+        partially written image. A failed write forgets the map key so the
+        next save for it tries again.
+        """
         if file_path.exists():
             return
+        tmp_path = file_path.with_suffix(".png.tmp")
         try:
-            file_path.write_bytes(map_image)
+            tmp_path.write_bytes(map_image)
+            os.replace(tmp_path, file_path)
         except Exception as e:
+            self._saved_map_keys.discard(map_key)
             logger.warning("Failed to save map image to disk: %s", e)
 
     def _get_current_map_image_and_hash(
@@ -733,34 +937,22 @@ class Capturer:
         Compute a difference hash using horizontal pixel comparisons.
         The output matches the WT-Plotter hash format.
         """
+        last = self._last_dhash
+        if last is not None and last[1] == size and last[0] == image_data:
+            return last[2]
         try:
-            from PIL import Image
-            import io
-
             img = Image.open(io.BytesIO(image_data))
             img = img.convert("L")
             img = img.resize((size, size - 1), Image.Resampling.LANCZOS)
 
-            pixels = list(img.getdata())
-            hash_bits = []
-            width = size
-            height = size - 1
-
-            for y in range(height):
-                for x in range(width - 1):
-                    left = pixels[y * width + x]
-                    right = pixels[y * width + x + 1]
-                    hash_bits.append(1 if left > right else 0)
-
-            hex_str = ""
-            for i in range(0, len(hash_bits), 4):
-                nibble = hash_bits[i : i + 4]
-                while len(nibble) < 4:
-                    nibble.append(0)
-                value = (nibble[0] << 3) | (nibble[1] << 2) | (nibble[2] << 1) | nibble[3]
-                hex_str += format(value, "x")
+            pixels = np.asarray(img, dtype=np.uint8)
+            hash_bits = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+            # packbits zero-pads the final byte; keep one hex digit per
+            # started nibble, matching the historic zero-padded format.
+            hex_str = np.packbits(hash_bits).tobytes().hex()[: -(-hash_bits.size // 4)]
 
             logger.debug("Computed dhash: %s (%s chars)", hex_str, len(hex_str))
+            self._last_dhash = (image_data, size, hex_str)
             return hex_str
         except Exception as e:
             logger.warning("Failed to compute dhash: %s", e)
@@ -771,34 +963,52 @@ class Capturer:
         _, map_hash = self._get_current_map_image_and_hash()
         return map_hash
 
-    def _save_raw_data(self) -> None:
-        """Save collected raw data to a JSON file."""
+    def _open_raw_file(self) -> None:
+        """Open the current match's raw NDJSON dump and write its header line."""
+        self._close_raw_file()
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        filepath = RAW_DATA_DIR / f"match_{self.state.current_match_id}_{timestamp}.ndjson"
         try:
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"match_{self.state.current_match_id}_{timestamp}.json"
-            filepath = RAW_DATA_DIR / filename
-
-            with open(filepath, "w", encoding="utf-8") as handle:
-                json.dump(
-                    {
-                        "match_id": self.state.current_match_id,
-                        "captured_at": timestamp,
-                        "tick_count": len(
-                            [
-                                data
-                                for data in self.raw_data
-                                if data["endpoint"] == "map_obj.json"
-                            ]
-                        ),
-                        "raw_responses": self.raw_data,
-                    },
-                    handle,
-                    indent=2,
-                )
+            self._raw_file = open(filepath, "wb")
+        except OSError as e:
+            logger.warning("Failed to open raw data file: %s", e)
+            return
+        self._raw_path = filepath
+        self._raw_tick_count = 0
+        self._append_raw_line(
+            {"match_id": self.state.current_match_id, "captured_at": timestamp}
+        )
 
-            logger.info("Raw data saved: %s", filepath)
+    def _append_raw(self, endpoint: str, timestamp: float, data: Any) -> None:
+        """Append one raw endpoint response to the open dump."""
+        self._append_raw_line(
+            {"endpoint": endpoint, "timestamp": timestamp, "data": data}
+        )
+
+    def _append_raw_line(self, record: Dict[str, Any]) -> None:
+        """Write a record as one NDJSON line, disabling the dump on failure."""
+        if self._raw_file is None:
+            return
+        try:
+            self._raw_file.write(orjson.dumps(record) + b"\n")
         except Exception as e:
             logger.warning("Failed to save raw data: %s", e)
+            self._close_raw_file()
+
+    def _close_raw_file(self) -> None:
+        """Close the raw dump for the current match, if one is open."""
+        raw_file, self._raw_file = self._raw_file, None
+        if raw_file is None:
+            return
+        try:
+            raw_file.close()
+            logger.info(
+                "Raw data saved: %s (%s ticks)",
+                self._raw_path,
+                self._raw_tick_count,
+            )
+        except OSError as e:
+            logger.warning("Failed to save raw data: %s", e)
 
     def _mark_match_nuke(self) -> None:
         """Persist a nuke detection flag for the current match."""
@@ -815,8 +1025,10 @@ class Capturer:
         if not name:
             return ""
         normalized = name.strip()
-        normalized = re.sub(r"^[^A-Za-z0-9]+", "", normalized)
-        return normalized.strip().lower()
+        first = normalized[:1]
+        if not (first.isascii() and first.isalnum()):
+            normalized = _MAP_NAME_PREFIX_RE.sub("", normalized).strip()
+        return normalized.lower()
 
     def _get_map_base_name(self, info: Optional[MapInfo]) -> str:
         """Return a normalized map name for switch detection."""
@@ -840,6 +1052,30 @@ class Capturer:
         curr_name = self._get_map_base_name(current)
         return bool(prev_name) and prev_name == curr_name
 
+    @staticmethod
+    def _group_ground_points(
+        objects: List[Dict[str, Any]],
+    ) -> Tuple[int, Dict[Any, List[Tuple[float, float]]]]:
+        """Return the ground object count and their (x, y) points by icon.
+
+        Each object is read once; objects whose icon or type is excluded from
+        transform matching are skipped.
+        """
+        excluded_icons = _TRANSFORM_EXCLUDED_ICONS
+        excluded_types = _TRANSFORM_EXCLUDED_TYPES
+        by_icon: Dict[Any, List[Tuple[float, float]]] = {}
+        count = 0
+        for obj in objects:
+            get = obj.get
+            icon = get("icon", "unknown")
+            if str(get("icon", "")).lower() in excluded_icons:
+                continue
+            if str(get("type", "")).lower() in excluded_types:
+                continue
+            by_icon.setdefault(icon, []).append((get("x", 0), get("y", 0)))
+            count += 1
+        return count, by_icon
+
     def _compute_air_transform(
         self,
         prev_objects: List[Dict[str, Any]],
@@ -849,81 +1085,55 @@ class Capturer:
         Compute air view transformation parameters by matching ground objects.
         Returns (a, b, c, d) where x_air = a*x_ground + b and y_air = c*y_ground + d.
         """
-        excluded_icons = {
-            icon.lower() for icon in CAPTURE_FILTERS.excluded_icons
-        }
-        excluded_types = {
-            obj_type.lower() for obj_type in CAPTURE_FILTERS.excluded_types
-        }
-
-        def is_ground_object(obj: Dict[str, Any]) -> bool:
-            """Return True for ground objects that should be used for matching."""
-            icon = str(obj.get("icon", "")).lower()
-            obj_type = str(obj.get("type", "")).lower()
-            if icon in excluded_icons:
-                return False
-            if obj_type in excluded_types:
-                return False
-            return True
-
-        prev_ground = [o for o in prev_objects if is_ground_object(o)]
-        curr_ground = [o for o in curr_objects if is_ground_object(o)]
+        prev_count, prev_by_icon = self._group_ground_points(prev_objects)
+        curr_count, curr_by_icon = self._group_ground_points(curr_objects)
 
         if (
-            len(prev_ground) < TRANSFORM_SETTINGS.min_points
-            or len(curr_ground) < TRANSFORM_SETTINGS.min_points
+            prev_count < TRANSFORM_SETTINGS.min_points
+            or curr_count < TRANSFORM_SETTINGS.min_points
         ):
             logger.debug(
                 "Not enough ground objects for transform: prev=%s, curr=%s",
-                len(prev_ground),
-                len(curr_ground),
+                prev_count,
+                curr_count,
             )
             return None
 
-        prev_by_icon: Dict[str, List[Dict[str, Any]]] = {}
-        for obj in prev_ground:
-            icon = obj.get("icon", "unknown")
-            if icon not in prev_by_icon:
-                prev_by_icon[icon] = []
-            prev_by_icon[icon].append(obj)
-
-        curr_by_icon: Dict[str, List[Dict[str, Any]]] = {}
-        for obj in curr_ground:
-            icon = obj.get("icon", "unknown")
-            if icon not in curr_by_icon:
-                curr_by_icon[icon] = []
-            curr_by_icon[icon].append(obj)
-
-        x1_list, y1_list, x2_list, y2_list = [], [], [], []
-        for icon, prev_list in prev_by_icon.items():
-            curr_list = curr_by_icon.get(icon, [])
-            for i, prev_obj in enumerate(prev_list):
-                if i < len(curr_list):
-                    curr_obj = curr_list[i]
-                    x1_list.append(prev_obj.get("x", 0))
-                    y1_list.append(prev_obj.get("y", 0))
-                    x2_list.append(curr_obj.get("x", 0))
-                    y2_list.append(curr_obj.get("y", 0))
-
-        if len(x1_list) < TRANSFORM_SETTINGS.min_points:
+        # Points sharing an icon are paired in list order; each pair becomes
+        # one (x_prev, y_prev, x_curr, y_curr) row of a single float array.
+        pairs: List[Tuple[float, float, float, float]] = [
+            (*prev_point, *curr_point)
+            for icon, prev_points in prev_by_icon.items()
+            for prev_point, curr_point in zip(
+                prev_points, curr_by_icon.get(icon, ())
+            )
+        ]
+
+        if len(pairs) < TRANSFORM_SETTINGS.min_points:
             logger.debug(
                 "Not enough matched objects for transform: %s",
-                len(x1_list),
+                len(pairs),
             )
             return None
 
-        x1 = np.array(x1_list)
-        y1 = np.array(y1_list)
-        x2 = np.array(x2_list)
-        y2 = np.array(y2_list)
-
-        A_x = np.column_stack([x1, np.ones_like(x1)])
-        params_x, residuals_x, _, _ = np.linalg.lstsq(A_x, x2, rcond=None)
-        a, b = params_x
+        coords = np.array(pairs, dtype=np.float64)
 
-        A_y = np.column_stack([y1, np.ones_like(y1)])
-        params_y, residuals_y, _, _ = np.linalg.lstsq(A_y, y2, rcond=None)
-        c, d = params_y
+        # Both axes are independent 1-D fits (x2 = a*x1 + b, y2 = c*y1 + d),
+        # solved together in closed form: slope = cov / var over the
+        # (x1, y1) and (x2, y2) column pairs.
+        mean = coords.mean(axis=0)
+        dev = coords - mean
+        var = np.square(dev[:, :2]).sum(axis=0)
+        if (var < TRANSFORM_SETTINGS.min_variance * len(pairs)).any():
+            logger.debug(
+                "Matched objects too clustered for transform: var=%s",
+                var / len(pairs),
+            )
+            return None
+        slope = (dev[:, :2] * dev[:, 2:]).sum(axis=0) / var
+        a, c = slope
+        b = mean[2] - a * mean[0]
+        d = mean[3] - c * mean[1]
 
         if a <= 0 or c <= 0:
             logger.warning("Invalid transform scale factors: a=%s, c=%s", a, c)
@@ -936,10 +1146,10 @@ class Capturer:
             )
             return None
 
-        x2_pred = a * x1 + b
-        y2_pred = c * y1 + d
-        error_x = np.mean(np.abs(x2_pred - x2))
-        error_y = np.mean(np.abs(y2_pred - y2))
+        # With the intercepts fixed at the means, each residual is the
+        # current deviation minus slope times the previous deviation, so
+        # both mean absolute errors come from one pass over dev.
+        error_x, error_y = np.abs(dev[:, 2:] - dev[:, :2] * slope).mean(axis=0)
 
         if error_x > TRANSFORM_SETTINGS.error_max or error_y > TRANSFORM_SETTINGS.error_max:
             logger.warning(
@@ -961,16 +1171,18 @@ class Capturer:
         )
         return (a, b, c, d)
 
-    def _apply_inverse_transform(self, x: float, y: float) -> Tuple[float, float]:
-        """Convert air-view coordinates back to ground reference frame."""
+    def _inverse_transform_params(self) -> Tuple[float, float, float, float]:
+        """Return (a, b, c, d) for mapping air-view points to ground.
+
+        Ground coordinates are (x - b) / a and (y - d) / c; a missing or
+        degenerate transform yields the identity.
+        """
         if not self.state.air_transform_params:
-            return x, y
+            return (1.0, 0.0, 1.0, 0.0)
         a, b, c, d = self.state.air_transform_params
         if a == 0 or c == 0:
-            return x, y
-        x_ground = (x - b) / a
-        y_ground = (y - d) / c
-        return x_ground, y_ground
+            return (1.0, 0.0, 1.0, 0.0)
+        return (a, b, c, d)
         
     @property
     def current_army_type(self) -> str:
@@ -26,6 +26,7 @@ class PathSettings:
     raw_dir: Path = DATA_DIR / "raw"
     db_path: Path = DATA_DIR / "matches.db"
     missing_hash_log: Path = DATA_DIR / "missing_map_hashes.log"
+    jinja_cache_dir: Path = DATA_DIR / "jinja_cache"
 
 
 @dataclass(frozen=True)
@@ -36,6 +37,8 @@ class AppSettings:
     port: int = 5000
     datetime_format: str = "%Y-%m-%d %H:%M:%S"
     open_browser_on_start: bool = True
+    server_threads: int = 8
+    server_channel_timeout: int = 30
 
 
 @dataclass(frozen=True)
@@ -114,6 +117,9 @@ class CaptureSettings:
     signature_rounding: int = 4
     valid_coord_min: float = 0.0
     valid_coord_max: float = 1.0
+    poll_workers: int = 3
+    air_map_probe_interval: float = 2.0
+    db_write_batch_max: int = 50
 
 
 @dataclass(frozen=True)
@@ -124,9 +130,9 @@ class CaptureTimeouts:
     map_info: float = 2.0
     map_image: float = 3.0
     current_map_image: float = 1.0
-    async_map_info: float = 1.0
-    async_indicators: float = 1.0
-    async_map_obj: float = 1.0
+    poll_map_info: float = 1.0
+    poll_indicators: float = 1.0
+    poll_map_obj: float = 1.0
     thread_join: float = 3.0
 
 
@@ -137,6 +143,9 @@ class TransformSettings:
     min_points: int = 3
     scale_max: float = 0.5
     error_max: float = 0.01
+    # Minimum per-axis variance of the matched ground points; tighter
+    # clusters cannot constrain the scale.
+    min_variance: float = 1e-6
 
 
 @dataclass(frozen=True)
@@ -156,12 +165,17 @@ class DbSettings:
             "journal_mode": "WAL",
             "synchronous": "NORMAL",
             "temp_store": "MEMORY",
+            "cache_size": "-65536",
+            "mmap_size": "268435456",
             "auto_vacuum": "INCREMENTAL",
             "busy_timeout": "5000",
         }
     )
     position_precision: int = 5
     capture_precision: int = 6
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    cached_statements: int = 256
 
 
 PATHS = PathSettings()
@@ -4,17 +4,28 @@ Uses SQLite to store matches, ticks, and position data.
 """
 from __future__ import annotations
 
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from functools import cached_property
 import logging
 import sqlite3
-from typing import Dict, List, Optional
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from config import DB_SETTINGS, PATHS
 
 DB_PATH = PATHS.db_path
 
+# (timestamp, army_type, vehicle_type, is_player_air, is_player_air_view)
+TickInput = Tuple[float, str, str, int, int]
+# (x, y, color, type, icon, is_poi, x_ground, y_ground)
+PositionRow = Tuple[
+    float, float, str, str, str, int, Optional[float], Optional[float]
+]
+
 _ENUM_TABLES = {
     "enum_colors": "color",
     "enum_types": "type",
@@ -25,6 +36,10 @@ _ENUM_TABLES = {
 
 _ENUM_CACHE: Dict[str, Dict[str, int]] = {table: {} for table in _ENUM_TABLES}
 
+_WRITE_LOCK = threading.Lock()
+
+_WRITER_ONLY_PRAGMAS = ("journal_mode", "auto_vacuum")
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -43,6 +58,8 @@ class Match:
     air_transform_b: Optional[float] = None
     air_transform_c: Optional[float] = None
     air_transform_d: Optional[float] = None
+    position_count: int = 0
+    duration_seconds: Optional[int] = None
 
     @cached_property
     def _map_info(self):
@@ -100,19 +117,114 @@ class Tick:
 def get_connection() -> sqlite3.Connection:
     """Return a configured database connection and ensure schema exists."""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    conn = sqlite3.connect(
+        str(DB_PATH),
+        check_same_thread=False,
+        cached_statements=DB_SETTINGS.cached_statements,
+    )
     conn.row_factory = sqlite3.Row
     _configure_connection(conn)
     _create_tables(conn)
     return conn
 
 
-def _configure_connection(conn: sqlite3.Connection) -> None:
+def _configure_connection(
+    conn: sqlite3.Connection,
+    read_only: bool = False,
+) -> None:
     """Apply SQLite PRAGMA settings for better performance and integrity."""
     for key, value in DB_SETTINGS.pragmas.items():
+        if read_only and key in _WRITER_ONLY_PRAGMAS:
+            continue
         conn.execute(f"PRAGMA {key} = {value}")
 
 
+def _open_read_only_connection() -> sqlite3.Connection:
+    """Return a configured read-only connection to an existing database."""
+    conn = sqlite3.connect(
+        f"{DB_PATH.resolve().as_uri()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=DB_SETTINGS.cached_statements,
+    )
+    conn.row_factory = sqlite3.Row
+    _configure_connection(conn, read_only=True)
+    return conn
+
+
+class ConnectionPool:
+    """Bounded pool of read-only connections for concurrent web requests.
+
+    WAL mode lets readers run alongside the writer, so each request thread
+    borrows its own connection instead of queueing on a shared one.
+    """
+
+    def __init__(
+        self,
+        min_size: int = DB_SETTINGS.pool_min_size,
+        max_size: int = DB_SETTINGS.pool_max_size,
+    ) -> None:
+        self._max_size = max(1, max_size)
+        self._idle: List[sqlite3.Connection] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(min(min_size, self._max_size)):
+            self._idle.append(_open_read_only_connection())
+            self._created += 1
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under capacity."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self._max_size:
+                    self._created += 1
+                    break
+                self._cond.wait()
+        try:
+            return _open_read_only_connection()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool, closing it if the pool is closed."""
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+            self._created -= 1
+        conn.close()
+
+    @contextmanager
+    def acquire(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection for the duration of the block."""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._checkin(conn)
+
+    def close(self) -> None:
+        """Close idle connections and reject further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
 def _ensure_enum_value(
     conn: sqlite3.Connection,
     table_name: str,
@@ -166,7 +278,8 @@ def _create_tables(conn: sqlite3.Connection) -> None:
             air_transform_a REAL,
             air_transform_b REAL,
             air_transform_c REAL,
-            air_transform_d REAL
+            air_transform_d REAL,
+            position_count INTEGER NOT NULL DEFAULT 0
         );
 
         CREATE TABLE IF NOT EXISTS enum_colors (
@@ -230,8 +343,27 @@ def _create_tables(conn: sqlite3.Connection) -> None:
         CREATE INDEX IF NOT EXISTS idx_positions_tick ON positions(tick_id);
         CREATE INDEX IF NOT EXISTS idx_ticks_match_ts ON ticks(match_id, timestamp_ms);
     """)
+    _migrate_schema(conn)
     conn.commit()
 
+
+def _migrate_schema(conn: sqlite3.Connection) -> None:
+    """Add columns introduced after the initial schema to existing databases."""
+    columns = {
+        row["name"] for row in conn.execute("PRAGMA table_info(matches)")
+    }
+    if "position_count" not in columns:
+        conn.execute(
+            "ALTER TABLE matches "
+            "ADD COLUMN position_count INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute(
+            """UPDATE matches
+               SET position_count = (
+                   SELECT COUNT(*) FROM positions WHERE match_id = matches.id
+               )"""
+        )
+
 def start_match(
     conn: sqlite3.Connection,
     map_hash: str = "",
@@ -333,24 +465,51 @@ def update_match_air_transform(
 def add_positions(
     conn: sqlite3.Connection,
     match_id: int,
-    positions: List[dict],
+    tick: TickInput,
+    positions: Sequence[PositionRow],
 ) -> None:
-    """Add multiple positions to a match."""
+    """Add one tick and its position rows to a match.
+
+    Each position row is (x, y, color, type, icon, is_poi, x_ground,
+    y_ground), so rows bind straight to the positions insert.
+    """
     if not positions:
         return
+    add_position_batches(conn, [(match_id, tick, positions)])
 
-    tick_source = positions[0]
-    timestamp_ms = _to_timestamp_ms(tick_source['timestamp'])
-    army_type_id = _ensure_enum_value(
-        conn,
-        "enum_army_types",
-        tick_source.get("army_type", "tank"),
-    )
-    vehicle_type_id = _ensure_enum_value(
-        conn,
-        "enum_vehicle_types",
-        tick_source.get("vehicle_type", ""),
-    )
+
+def add_position_batches(
+    conn: sqlite3.Connection,
+    batches: Sequence[Tuple[int, TickInput, Sequence[PositionRow]]],
+) -> None:
+    """Add several (match_id, tick, positions) batches in one transaction.
+
+    On failure nothing is written and the error is re-raised.
+    """
+    try:
+        for match_id, tick, positions in batches:
+            if positions:
+                _insert_tick_positions(conn, match_id, tick, positions)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Enum ids inserted by the rolled-back transaction no longer exist.
+        for cache in _ENUM_CACHE.values():
+            cache.clear()
+        raise
+
+
+def _insert_tick_positions(
+    conn: sqlite3.Connection,
+    match_id: int,
+    tick: TickInput,
+    positions: Sequence[PositionRow],
+) -> None:
+    """Insert one tick and its position rows without committing."""
+
+    timestamp, army_type, vehicle_type, is_player_air, is_player_air_view = tick
+    army_type_id = _ensure_enum_value(conn, "enum_army_types", army_type)
+    vehicle_type_id = _ensure_enum_value(conn, "enum_vehicle_types", vehicle_type)
 
     cur = conn.execute(
         """INSERT INTO ticks
@@ -358,33 +517,30 @@ def add_positions(
            VALUES (?, ?, ?, ?, ?, ?)""",
         (
             match_id,
-            timestamp_ms,
+            _to_timestamp_ms(timestamp),
             army_type_id,
             vehicle_type_id,
-            tick_source.get('is_player_air', 0),
-            tick_source.get('is_player_air_view', 0)
+            is_player_air,
+            is_player_air_view,
         )
     )
     tick_id = cur.lastrowid
 
-    rows = []
-    for p in positions:
-        color_id = _ensure_enum_value(conn, "enum_colors", p.get('color', ''))
-        type_id = _ensure_enum_value(conn, "enum_types", p.get('type', ''))
-        icon_id = _ensure_enum_value(conn, "enum_icons", p.get('icon', ''))
-
-        rows.append((
+    rows = [
+        (
             match_id,
             tick_id,
-            _quantize_coord(p["x"]),
-            _quantize_coord(p["y"]),
-            color_id,
-            type_id,
-            icon_id,
-            p.get("is_poi", 0),
-            _quantize_coord(p.get("x_ground")),
-            _quantize_coord(p.get("y_ground")),
-        ))
+            _quantize_coord(x),
+            _quantize_coord(y),
+            _ensure_enum_value(conn, "enum_colors", color),
+            _ensure_enum_value(conn, "enum_types", obj_type),
+            _ensure_enum_value(conn, "enum_icons", icon),
+            is_poi,
+            _quantize_coord(x_ground),
+            _quantize_coord(y_ground),
+        )
+        for x, y, color, obj_type, icon, is_poi, x_ground, y_ground in positions
+    ]
 
     conn.executemany(
         """INSERT INTO positions (
@@ -393,7 +549,10 @@ def add_positions(
            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         rows
     )
-    conn.commit()
+    conn.execute(
+        "UPDATE matches SET position_count = position_count + ? WHERE id = ?",
+        (len(rows), match_id)
+    )
 
 
 def get_active_match(conn: sqlite3.Connection) -> Optional[Match]:
@@ -415,87 +574,195 @@ def get_match(conn: sqlite3.Connection, match_id: int) -> Optional[Match]:
 
 
 def get_all_matches(conn: sqlite3.Connection) -> List[Match]:
-    """Get all matches, newest first."""
+    """Get all matches, newest first, with durations computed in SQL.
+
+    Timestamps are stored as local ISO strings, so open matches are measured
+    against local 'now'. Unparseable timestamps yield a NULL duration.
+    """
     rows = conn.execute(
-        "SELECT * FROM matches ORDER BY started_at DESC"
+        """
+        SELECT
+            *,
+            MAX(
+                0,
+                CAST(
+                    ROUND(
+                        (
+                            julianday(COALESCE(ended_at, datetime('now', 'localtime')))
+                            - julianday(started_at)
+                        ) * 86400.0,
+                        3
+                    ) AS INTEGER
+                )
+            ) AS duration_seconds
+        FROM matches
+        ORDER BY started_at DESC
+        """
     ).fetchall()
     return [Match(**dict(row)) for row in rows]
 
 
+def get_matches_version(
+    conn: sqlite3.Connection,
+) -> Tuple[Optional[int], int, Optional[int], Optional[int]]:
+    """Return a cheap fingerprint of the match list for cache keys.
+
+    The tuple is (newest match id, match count, active match id, active
+    match position count); any start, end or delete changes it.
+    """
+    row = conn.execute(
+        """
+        SELECT
+            MAX(m.id) AS last_id,
+            COUNT(*) AS total,
+            a.id AS active_id,
+            a.position_count AS active_count
+        FROM matches m
+        LEFT JOIN (
+            SELECT id, position_count
+            FROM matches
+            WHERE ended_at IS NULL
+            ORDER BY id DESC
+            LIMIT 1
+        ) a ON 1 = 1
+        """
+    ).fetchone()
+    return (
+        row["last_id"],
+        row["total"],
+        row["active_id"],
+        row["active_count"],
+    )
+
+
+_POSITIONS_SQL = """
+    SELECT
+        p.id,
+        p.tick_id,
+        p.x,
+        p.y,
+        p.is_poi,
+        p.x_ground,
+        p.y_ground,
+        c.value AS color,
+        t.value AS type,
+        i.value AS icon,
+        tk.timestamp_ms AS tick_timestamp,
+        at.value AS army_type,
+        vt.value AS vehicle_type,
+        tk.is_player_air,
+        tk.is_player_air_view
+    FROM ticks tk
+    INNER JOIN positions p ON p.tick_id = tk.id
+    LEFT JOIN enum_colors c ON c.id = p.color_id
+    LEFT JOIN enum_types t ON t.id = p.type_id
+    LEFT JOIN enum_icons i ON i.id = p.icon_id
+    LEFT JOIN enum_army_types at ON at.id = tk.army_type_id
+    LEFT JOIN enum_vehicle_types vt ON vt.id = tk.vehicle_type_id
+    WHERE tk.match_id = ? AND tk.timestamp_ms >= ?
+    ORDER BY tk.timestamp_ms, tk.id, p.id
+    """
+
+
 def get_positions_bundle(
     conn: sqlite3.Connection,
     match_id: int,
     since_ts_ms: int = 0,
-) -> Dict[str, List[dict]]:
-    """Get positions and ticks for a match, optionally since a timestamp."""
-    rows = conn.execute(
-        """
-        SELECT
-            p.id,
-            p.tick_id,
-            p.x,
-            p.y,
-            p.is_poi,
-            p.x_ground,
-            p.y_ground,
-            c.value AS color,
-            t.value AS type,
-            i.value AS icon,
-            tk.timestamp_ms AS tick_timestamp,
-            at.value AS army_type,
-            vt.value AS vehicle_type,
-            tk.is_player_air,
-            tk.is_player_air_view
-        FROM positions p
-        INNER JOIN ticks tk ON tk.id = p.tick_id
-        LEFT JOIN enum_colors c ON c.id = p.color_id
-        LEFT JOIN enum_types t ON t.id = p.type_id
-        LEFT JOIN enum_icons i ON i.id = p.icon_id
-        LEFT JOIN enum_army_types at ON at.id = tk.army_type_id
-        LEFT JOIN enum_vehicle_types vt ON vt.id = tk.vehicle_type_id
-        WHERE p.match_id = ? AND tk.timestamp_ms >= ?
-        ORDER BY tk.timestamp_ms, p.id
-        """,
-        (match_id, int(since_ts_ms))
-    ).fetchall()
+) -> Dict[str, Any]:
+    """Get positions and ticks for a match, optionally since a timestamp.
+
+    Positions are returned column-wise (one list or array per field) so the
+    payload does not repeat every key for every row.
+    """
+    cursor = conn.execute(_POSITIONS_SQL, (match_id, int(since_ts_ms)))
+    cursor.row_factory = None
+    rows = cursor.fetchall()
+    (
+        ids,
+        tick_ids,
+        xs,
+        ys,
+        is_poi,
+        x_ground,
+        y_ground,
+        colors,
+        types,
+        icons,
+        tick_timestamps,
+        army_types,
+        vehicle_types,
+        is_player_air,
+        is_player_air_view,
+    ) = zip(*rows) if rows else ((),) * 15
 
     ticks_by_id: Dict[int, dict] = {}
-    positions: List[dict] = []
-    for row in rows:
-        tick_id = row["tick_id"]
+    for tick_id, timestamp, army_type, vehicle_type, player_air, air_view in zip(
+        tick_ids,
+        tick_timestamps,
+        army_types,
+        vehicle_types,
+        is_player_air,
+        is_player_air_view,
+    ):
         if tick_id not in ticks_by_id:
             ticks_by_id[tick_id] = {
                 "id": tick_id,
-                "timestamp": row["tick_timestamp"],
-                "army_type": row["army_type"],
-                "vehicle_type": row["vehicle_type"],
-                "is_player_air": row["is_player_air"],
-                "is_player_air_view": row["is_player_air_view"],
+                "timestamp": timestamp,
+                "army_type": army_type,
+                "vehicle_type": vehicle_type,
+                "is_player_air": player_air,
+                "is_player_air_view": air_view,
             }
-        positions.append({
-            "id": row["id"],
-            "tick_id": tick_id,
-            "x": row["x"],
-            "y": row["y"],
-            "color": row["color"],
-            "type": row["type"],
-            "icon": row["icon"],
-            "is_poi": row["is_poi"],
-            "x_ground": row["x_ground"],
-            "y_ground": row["y_ground"],
-        })
+
+    positions = {
+        "id": list(ids),
+        "tick_id": list(tick_ids),
+        "x": np.array(xs, dtype=np.float64),
+        "y": np.array(ys, dtype=np.float64),
+        "color": list(colors),
+        "type": list(types),
+        "icon": list(icons),
+        "is_poi": list(is_poi),
+        "x_ground": np.array(x_ground, dtype=np.float64),
+        "y_ground": np.array(y_ground, dtype=np.float64),
+    }
 
     ticks = list(ticks_by_id.values())
     ticks.sort(key=lambda item: item["timestamp"])
     return {"positions": positions, "ticks": ticks}
 
 
-def get_positions_count(conn: sqlite3.Connection, match_id: int) -> int:
-    """Get the number of positions for a match."""
+def iter_position_rows(
+    conn: sqlite3.Connection,
+    match_id: int,
+    since_ts_ms: int = 0,
+    batch_size: int = 1000,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield position rows, joined with their tick, in batches.
+
+    Rows follow the same ordering as get_positions_bundle but are read with
+    fetchmany so callers can stream long matches without holding them all.
+    """
+    cursor = conn.execute(_POSITIONS_SQL, (match_id, int(since_ts_ms)))
+    cursor.row_factory = None
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [dict(zip(columns, row)) for row in rows]
+
+
+def get_latest_tick_timestamp(
+    conn: sqlite3.Connection,
+    match_id: int,
+) -> Optional[int]:
+    """Get the newest tick timestamp for a match, or None without ticks."""
     row = conn.execute(
-        "SELECT COUNT(*) as cnt FROM positions WHERE match_id = ?", (match_id,)
+        "SELECT MAX(timestamp_ms) AS ts FROM ticks WHERE match_id = ?",
+        (match_id,)
     ).fetchone()
-    return row["cnt"] if row else 0
+    return row["ts"] if row else None
 
 
 def get_latest_tick(conn: sqlite3.Connection, match_id: int) -> Optional[Tick]:
@@ -526,21 +793,24 @@ def get_latest_tick(conn: sqlite3.Connection, match_id: int) -> Optional[Tick]:
 
 def delete_match(conn: sqlite3.Connection, match_id: int) -> None:
     """Delete a match and its positions."""
-    conn.execute("DELETE FROM positions WHERE match_id = ?", (match_id,))
-    conn.execute("DELETE FROM ticks WHERE match_id = ?", (match_id,))
-    conn.execute("DELETE FROM matches WHERE id = ?", (match_id,))
-    conn.commit()
-    try:
-        conn.execute("VACUUM")
-    except sqlite3.OperationalError:
-        logger.warning("VACUUM failed after delete")
+    with _WRITE_LOCK:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM positions WHERE match_id = ?", (match_id,))
+            conn.execute("DELETE FROM ticks WHERE match_id = ?", (match_id,))
+            conn.execute("DELETE FROM matches WHERE id = ?", (match_id,))
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError:
+            logger.warning("VACUUM failed after delete")
 
 
 def close_orphaned_matches(conn: sqlite3.Connection) -> int:
     """Close any matches that were left without ended_at (e.g., after hard quit).
     Returns the number of matches closed."""
-    cur = conn.execute(
-        "UPDATE matches SET ended_at = datetime('now') WHERE ended_at IS NULL"
-    )
-    conn.commit()
+    with _WRITE_LOCK:
+        cur = conn.execute(
+            "UPDATE matches SET ended_at = datetime('now') WHERE ended_at IS NULL"
+        )
+        conn.commit()
     return cur.rowcount
@@ -65,8 +65,8 @@ class MatchSummaryPayload(MatchPayloadBase):
             started_at=match.started_at,
             ended_at=match.ended_at,
             map_name=map_info.display_name,
-            nuke_detected=getattr(match, "nuke_detected", 0),
-            initial_capture_count=getattr(match, "initial_capture_count", None),
+            nuke_detected=match.nuke_detected,
+            initial_capture_count=match.initial_capture_count,
             air_map_name=air_info.display_name if air_info else None,
             duration_seconds=duration_seconds,
             position_count=position_count,
@@ -76,14 +76,10 @@ class MatchSummaryPayload(MatchPayloadBase):
     def to_dict(self) -> Dict[str, Any]:
         """Return the summary payload as a dict."""
         payload = super().to_dict()
-        payload.update(
-            {
-                "air_map_name": self.air_map_name,
-                "duration_seconds": self.duration_seconds,
-                "position_count": self.position_count,
-                "is_active": self.is_active,
-            }
-        )
+        payload["air_map_name"] = self.air_map_name
+        payload["duration_seconds"] = self.duration_seconds
+        payload["position_count"] = self.position_count
+        payload["is_active"] = self.is_active
         return payload
 
 
@@ -110,27 +106,23 @@ class MatchListPayload(MatchPayloadBase):
             started_at=match.started_at,
             ended_at=match.ended_at,
             map_name=map_info.display_name,
-            nuke_detected=getattr(match, "nuke_detected", 0),
-            initial_capture_count=getattr(match, "initial_capture_count", None),
+            nuke_detected=match.nuke_detected,
+            initial_capture_count=match.initial_capture_count,
             map_id=map_info.map_id,
             battle_type=map_info.battle_type.value,
-            initial_capture_x=getattr(match, "initial_capture_x", None),
-            initial_capture_y=getattr(match, "initial_capture_y", None),
+            initial_capture_x=match.initial_capture_x,
+            initial_capture_y=match.initial_capture_y,
             position_count=position_count,
         )
 
     def to_dict(self) -> Dict[str, Any]:
         """Return the list payload as a dict."""
         payload = super().to_dict()
-        payload.update(
-            {
-                "map_id": self.map_id,
-                "battle_type": self.battle_type,
-                "initial_capture_x": self.initial_capture_x,
-                "initial_capture_y": self.initial_capture_y,
-                "position_count": self.position_count,
-            }
-        )
+        payload["map_id"] = self.map_id
+        payload["battle_type"] = self.battle_type
+        payload["initial_capture_x"] = self.initial_capture_x
+        payload["initial_capture_y"] = self.initial_capture_y
+        payload["position_count"] = self.position_count
         return payload
 
 
@@ -160,35 +152,31 @@ class MatchDetailPayload(MatchPayloadBase):
             started_at=match.started_at,
             ended_at=match.ended_at,
             map_name=map_info.display_name,
-            nuke_detected=getattr(match, "nuke_detected", 0),
-            initial_capture_count=getattr(match, "initial_capture_count", None),
+            nuke_detected=match.nuke_detected,
+            initial_capture_count=match.initial_capture_count,
             map_hash=match.map_hash,
             map_id=map_info.map_id,
             battle_type=map_info.battle_type.value,
-            initial_capture_x=getattr(match, "initial_capture_x", None),
-            initial_capture_y=getattr(match, "initial_capture_y", None),
-            air_transform_a=getattr(match, "air_transform_a", None),
-            air_transform_b=getattr(match, "air_transform_b", None),
-            air_transform_c=getattr(match, "air_transform_c", None),
-            air_transform_d=getattr(match, "air_transform_d", None),
+            initial_capture_x=match.initial_capture_x,
+            initial_capture_y=match.initial_capture_y,
+            air_transform_a=match.air_transform_a,
+            air_transform_b=match.air_transform_b,
+            air_transform_c=match.air_transform_c,
+            air_transform_d=match.air_transform_d,
         )
 
     def to_dict(self) -> Dict[str, Any]:
         """Return the detail payload as a dict."""
         payload = super().to_dict()
-        payload.update(
-            {
-                "map_hash": self.map_hash,
-                "map_id": self.map_id,
-                "battle_type": self.battle_type,
-                "initial_capture_x": self.initial_capture_x,
-                "initial_capture_y": self.initial_capture_y,
-                "air_transform_a": self.air_transform_a,
-                "air_transform_b": self.air_transform_b,
-                "air_transform_c": self.air_transform_c,
-                "air_transform_d": self.air_transform_d,
-            }
-        )
+        payload["map_hash"] = self.map_hash
+        payload["map_id"] = self.map_id
+        payload["battle_type"] = self.battle_type
+        payload["initial_capture_x"] = self.initial_capture_x
+        payload["initial_capture_y"] = self.initial_capture_y
+        payload["air_transform_a"] = self.air_transform_a
+        payload["air_transform_b"] = self.air_transform_b
+        payload["air_transform_c"] = self.air_transform_c
+        payload["air_transform_d"] = self.air_transform_d
         return payload
 
 
@@ -221,26 +209,26 @@ class PositionEntry:
         if self.icon is None:
             raise ValueError("icon is required")
 
-    def set_ground(self, x_ground: float, y_ground: float) -> None:
-        """Set ground coordinates for air-view positions."""
-        self.x_ground = x_ground
-        self.y_ground = y_ground
+    def to_tick(self) -> db.TickInput:
+        """Return the tick-level fields shared by every entry of a tick."""
+        return (
+            self.timestamp,
+            self.army_type,
+            self.vehicle_type,
+            int(self.is_player_air),
+            int(self.is_player_air_view),
+        )
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Return the position entry as a dict."""
+    def to_row(self) -> db.PositionRow:
+        """Return the position entry as a row for db.add_positions."""
         self.validate()
-        return {
-            "x": self.x,
-            "y": self.y,
-            "color": self.color,
-            "type": self.obj_type,
-            "icon": self.icon,
-            "timestamp": self.timestamp,
-            "is_poi": int(self.is_poi),
-            "army_type": self.army_type,
-            "vehicle_type": self.vehicle_type,
-            "is_player_air": int(self.is_player_air),
-            "is_player_air_view": int(self.is_player_air_view),
-            "x_ground": self.x_ground,
-            "y_ground": self.y_ground,
-        }
+        return (
+            self.x,
+            self.y,
+            self.color,
+            self.obj_type,
+            self.icon,
+            int(self.is_poi),
+            self.x_ground,
+            self.y_ground,
+        )
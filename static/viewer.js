@@ -213,27 +213,78 @@ class MatchViewer {
         img.src = `/api/match/${this.matchId}/map.png`;
     }
     
+    _decodePositions(buffer) {
+        // Binary layout: uint32 header length, uint32 row count, JSON header
+        // (ticks + string dictionaries), then one little-endian array per column
+        const view = new DataView(buffer);
+        const headerLength = view.getUint32(0, true);
+        const count = view.getUint32(4, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+        let offset = 8 + headerLength;
+        const take = (ArrayType) => {
+            const array = new ArrayType(buffer, offset, count);
+            offset += count * ArrayType.BYTES_PER_ELEMENT;
+            return array;
+        };
+        const ids = take(Uint32Array);
+        const tickIds = take(Uint32Array);
+        const xs = take(Float32Array);
+        const ys = take(Float32Array);
+        const xGround = take(Float32Array);
+        const yGround = take(Float32Array);
+        const colorIdx = take(Uint16Array);
+        const typeIdx = take(Uint16Array);
+        const iconIdx = take(Uint16Array);
+        const isPoi = take(Uint8Array);
+        const orNull = (value) => (Number.isNaN(value) ? null : value);
+        return {
+            ticks: header.ticks || [],
+            columns: {
+                id: ids,
+                tick_id: tickIds,
+                x: xs,
+                y: ys,
+                x_ground: Array.from(xGround, orNull),
+                y_ground: Array.from(yGround, orNull),
+                color: Array.from(colorIdx, (i) => header.colors[i]),
+                type: Array.from(typeIdx, (i) => header.types[i]),
+                icon: Array.from(iconIdx, (i) => header.icons[i]),
+                is_poi: isPoi
+            }
+        };
+    }
+
     async _loadPositions() {
         try {
-            const resp = await fetch(`/api/match/${this.matchId}/positions?since=${this.lastTimestamp}`);
-            const data = await resp.json();
-            const ticks = data.ticks || [];
-            const positions = data.positions || [];
-            
-            if (positions.length > 0) {
+            const resp = await fetch(`/api/match/${this.matchId}/positions.bin?since=${this.lastTimestamp}`);
+            const { ticks, columns } = this._decodePositions(await resp.arrayBuffer());
+            // Positions arrive column-wise: one array per field, indexed by row
+            const count = columns.id.length;
+
+            if (count > 0) {
                 const tickMap = new Map();
                 for (const tick of ticks) {
                     tickMap.set(tick.id, tick);
                 }
 
                 // Process positions: attach tick metadata and use ground coordinates when available
-                const processed = positions.map(pos => {
-                    const tick = tickMap.get(pos.tick_id);
+                const processed = [];
+                for (let i = 0; i < count; i++) {
+                    const tick = tickMap.get(columns.tick_id[i]);
                     if (!tick) {
-                        return null;
+                        continue;
                     }
                     const merged = {
-                        ...pos,
+                        id: columns.id[i],
+                        tick_id: columns.tick_id[i],
+                        x: columns.x[i],
+                        y: columns.y[i],
+                        color: columns.color[i],
+                        type: columns.type[i],
+                        icon: columns.icon[i],
+                        is_poi: columns.is_poi[i],
+                        x_ground: columns.x_ground[i],
+                        y_ground: columns.y_ground[i],
                         timestamp: tick.timestamp,
                         army_type: tick.army_type,
                         vehicle_type: tick.vehicle_type,
@@ -242,16 +293,17 @@ class MatchViewer {
                     };
                     if (merged.x_ground !== null && merged.x_ground !== undefined &&
                         merged.y_ground !== null && merged.y_ground !== undefined) {
-                        return {
+                        processed.push({
                             ...merged,
                             x: merged.x_ground,
                             y: merged.y_ground,
                             x_original: merged.x,
                             y_original: merged.y
-                        };
+                        });
+                        continue;
                     }
-                    return merged;
-                }).filter(Boolean);
+                    processed.push(merged);
+                }
 
                 // Separate POIs from regular positions (store all for stats, filter aircraft for display)
                 for (const pos of processed) {